@@ -0,0 +1,24 @@
+import os
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', 5001)}"
+
+if os.environ.get('DATABASE_URL'):
+    # Every handler blocks only on database I/O, so gevent workers let one process serve many requests at once
+    worker_class = 'gevent'
+    workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+    worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 1000))
+else:
+    # The SQLite fallback: sqlite3 calls would block a gevent hub, and several workers would race
+    # to create_all() on a fresh database file, so serve from one sync worker
+    worker_class = 'sync'
+    workers = 1
+
+def post_fork(server, worker):
+    """Make psycopg2 yield to other greenlets while waiting on PostgreSQL, when it is installed"""
+    if worker_class != 'gevent':
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        return
+    patch_psycopg()
@@ -8,14 +8,23 @@ from datetime import datetime
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Resolve the project root and database path once at import
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_DB_PATH = os.path.join(_HERE, 'src', 'database', 'app.db')
+
 # Add the project root to the Python path
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _HERE)
 
-def migrate_database():
-    """Migrate the database schema to include new columns and tables"""
+def migrate_database(fast=False):
+    """Migrate the database schema to include new columns and tables
+    
+    fast=True takes an exclusive lock and turns off journaling durability for the run;
+    only use it when no other process has the database open.
+    """
+    conn = None
     try:
         # Get database path
-        db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src', 'database', 'app.db')
+        db_path = _DB_PATH
         
         if not os.path.exists(db_path):
             logger.error(f"Database file not found at {db_path}")
@@ -25,46 +34,69 @@ def migrate_database():
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
         
+        # Tune SQLite for a bulk schema change; journal_mode must be set outside a transaction
+        if fast:
+            # Offline run: no checkpoints or fsyncs, the migration is idempotent and can simply be re-run
+            cursor.execute("PRAGMA locking_mode=EXCLUSIVE")
+            cursor.execute("PRAGMA journal_mode=MEMORY")
+            cursor.execute("PRAGMA synchronous=OFF")
+        else:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-64000")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        
+        # Run the whole migration in one write transaction so it syncs once and rolls back atomically
+        cursor.execute("BEGIN IMMEDIATE")
+        
         # Check if user table exists
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='user'")
         if not cursor.fetchone():
             logger.error("User table not found in database")
-            conn.close()
+            conn.rollback()
             return False
         
         # Get existing columns in user table
         cursor.execute("PRAGMA table_info(user)")
-        existing_columns = [column[1] for column in cursor.fetchall()]
+        existing_columns = {column[1] for column in cursor.fetchall()}
         
-        # Add missing columns to user table
+        # Add missing columns to user table. SQLite ignores VARCHAR lengths, so text columns are plain TEXT,
+        # and ADD COLUMN only accepts constant defaults; created_at/updated_at are backfilled below instead.
         columns_to_add = {
             'trial_active': 'BOOLEAN DEFAULT 1',
             'trial_start_date': 'TIMESTAMP',
             'trial_end_date': 'TIMESTAMP',
             'trial_days_used': 'INTEGER DEFAULT 0',
-            'trial_status': 'VARCHAR(50) DEFAULT "active"',
-            'subscription_plan': 'VARCHAR(50)',
-            'subscription_status': 'VARCHAR(50)',
-            'plan': 'VARCHAR(50)',
+            'trial_status': "TEXT DEFAULT 'active'",
+            'subscription_plan': 'TEXT',
+            'subscription_status': 'TEXT',
+            'plan': 'TEXT',
             'subscription_start_date': 'TIMESTAMP',
             'last_payment_date': 'TIMESTAMP',
             'next_billing_date': 'TIMESTAMP',
             'payment_required': 'BOOLEAN DEFAULT 0',
-            'stripe_customer_id': 'VARCHAR(255)',
-            'stripe_payment_intent_id': 'VARCHAR(255)',
-            'created_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP',
-            'updated_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP',
+            'stripe_customer_id': 'TEXT',
+            'stripe_payment_intent_id': 'TEXT',
+            'created_at': 'TIMESTAMP',
+            'updated_at': 'TIMESTAMP',
             'last_login': 'TIMESTAMP',
             'last_trial_check': 'TIMESTAMP'
         }
         
-        for column, data_type in columns_to_add.items():
-            if column not in existing_columns:
-                try:
-                    cursor.execute(f"ALTER TABLE user ADD COLUMN {column} {data_type}")
-                    logger.info(f"Added column '{column}' to user table")
-                except sqlite3.OperationalError as e:
-                    logger.warning(f"Could not add column '{column}': {str(e)}")
+        # Work out the missing columns up front; the write lock taken above means none can appear meanwhile
+        missing = [(column, data_type) for column, data_type in columns_to_add.items() if column not in existing_columns]
+        added_columns = []
+        for column, data_type in missing:
+            cursor.execute(f"ALTER TABLE user ADD COLUMN {column} {data_type}")
+            added_columns.append(column)
+        if added_columns:
+            logger.info("Added columns to user table: %s", ", ".join(added_columns))
+        
+        # Index the trial columns so the defaults UPDATE and trial-status lookups use a range scan
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_user_trial ON user (trial_active, trial_end_date, subscription_status)"
+        )
         
         # Create portfolio table if it doesn't exist
         cursor.execute("""
@@ -129,23 +161,54 @@ def migrate_database():
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_portfolio_user_id ON portfolio (user_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_property_user_id ON property (user_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_report_user_id ON report (user_id)")
+        # Every get/update/delete filters on (id, user_id); one composite index resolves both predicates
+        for table in ('portfolio', 'property', 'report'):
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_user_id_id ON {table} (user_id, id)")
+        # Shared-link lookups only ever hit public portfolios, so index just those rows
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_portfolio_share_public ON portfolio (share_id) WHERE is_public = 1"
+        )
+        # Serves "my reports, newest first" straight from the index without a sort
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_report_user_generated ON report (user_id, generated_at DESC)"
+        )
         logger.info("Created or verified indexes")
         
-        # Set default values for existing users
-        cursor.execute("""
-        UPDATE user 
-        SET 
-            trial_active = 1,
-            trial_status = 'active',
-            subscription_status = 'trial',
-            created_at = CURRENT_TIMESTAMP,
-            updated_at = CURRENT_TIMESTAMP
-        WHERE trial_active IS NULL
-        """)
+        # Backfill trial defaults for existing users in a single pass, skipping the scan when nothing needs them.
+        # Every SET expression sees the pre-update row, so the trial end date is derived inline each time.
+        defaults_filter = "trial_active IS NULL OR trial_end_date IS NULL OR trial_status IS NULL"
+        needs_defaults = added_columns or cursor.execute(
+            f"SELECT 1 FROM user WHERE {defaults_filter} LIMIT 1"
+        ).fetchone()
+        if needs_defaults:
+            cursor.execute(f"""
+            UPDATE user 
+            SET 
+                trial_start_date = COALESCE(trial_start_date, created_at, CURRENT_TIMESTAMP),
+                trial_end_date = COALESCE(trial_end_date, datetime(COALESCE(trial_start_date, created_at, CURRENT_TIMESTAMP), '+7 days')),
+                trial_active = COALESCE(trial_active, CASE
+                    WHEN datetime('now') <= COALESCE(trial_end_date, datetime(COALESCE(trial_start_date, created_at, CURRENT_TIMESTAMP), '+7 days'))
+                    THEN 1 ELSE 0 END),
+                trial_status = COALESCE(trial_status, CASE
+                    WHEN datetime('now') <= COALESCE(trial_end_date, datetime(COALESCE(trial_start_date, created_at, CURRENT_TIMESTAMP), '+7 days'))
+                    THEN 'active' ELSE 'expired' END),
+                subscription_status = COALESCE(subscription_status, 'trial'),
+                created_at = COALESCE(created_at, CURRENT_TIMESTAMP),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE {defaults_filter}
+            """)
         
-        # Commit changes and close connection
+        # Refresh planner statistics so the new indexes are picked up
+        cursor.execute("ANALYZE user")
+        
+        # Commit changes; the connection is closed in the finally block
         conn.commit()
-        conn.close()
+        
+        if fast:
+            # Hand the database back in the journal mode the app expects
+            cursor.execute("PRAGMA locking_mode=NORMAL")
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
         
         logger.info("Database migration completed successfully")
         return True
@@ -153,9 +216,13 @@ def migrate_database():
     except Exception as e:
         logger.error(f"Database migration failed: {str(e)}")
         return False
+    finally:
+        # Closing without a commit discards a half-applied migration
+        if conn:
+            conn.close()
 
 if __name__ == "__main__":
-    if migrate_database():
+    if migrate_database(fast='--fast' in sys.argv[1:]):
         print("Database migration completed successfully")
     else:
         print("Database migration failed")
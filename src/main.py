@@ -3,56 +3,132 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from sqlalchemy import event
+import orjson
 from src.models.user import db
-from src.routes.user import user_bp
-from src.routes.subscription import subscription_bp
-from src.routes.portfolio import portfolio_bp
-from src.routes.property import property_bp
-from src.routes.report import report_bp
-from src.routes.data import data_bp
-
-app = Flask(__name__)
-
-# Use environment variable for secret key in production
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'giso-invest-auth-secret-key-2024')
-
-# Enable CORS for all routes
-CORS(app, origins="*", allow_headers=["Content-Type", "Authorization"])
-
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(subscription_bp, url_prefix='/api')
-app.register_blueprint(portfolio_bp, url_prefix='/api')
-app.register_blueprint(property_bp, url_prefix='/api')
-app.register_blueprint(report_bp, url_prefix='/api')
-app.register_blueprint(data_bp, url_prefix='/api')
-
-# Database configuration - use environment variable for production
-database_url = os.environ.get('DATABASE_URL')
-if database_url:
-    # Production database (PostgreSQL)
-    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-else:
-    # Development database (SQLite)
-    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-
-# Create database tables
-with app.app_context():
-    db.create_all()
-
-@app.route('/')
-def home():
-    """Home endpoint"""
-    return "GISO Invest Authentication Service is running", 200
-
-@app.route('/health')
-def health_check():
-    """Health check endpoint"""
-    return {"status": "healthy", "service": "GISO Invest Authentication Service"}, 200
+
+# Resolve the development database path once at import
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_DB_PATH = os.path.join(_HERE, 'database', 'app.db')
+
+# Per-connection SQLite tuning: WAL journaling, relaxed fsync, bigger page cache and mmap
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA foreign_keys=ON",
+)
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply SQLITE_PRAGMAS to every new SQLite connection"""
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson for both request parsing and responses; datetimes serialize natively"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default), mimetype=self.mimetype
+        )
+
+class GisoFlask(Flask):
+    """Flask app that lets browsers cache content-hashed build assets, and revalidates the HTML entry point"""
+
+    json_provider_class = OrjsonProvider
+
+    # One year for the content-hashed build output under assets/. Other static files such as favicon.ico
+    # keep their name when replaced, so they get Flask's default; index.html is revalidated on every load
+    static_max_age = 31536000
+    hashed_assets_dir = 'assets/'
+
+    def get_send_file_max_age(self, filename):
+        if filename and os.path.basename(filename) == 'index.html':
+            return 0
+        if filename and filename.replace('\\', '/').startswith(self.hashed_assets_dir):
+            return self.static_max_age
+        return super().get_send_file_max_age(filename)
+
+def _register_blueprints(app):
+    """Import the API blueprints and mount them under /api"""
+    from src.routes.user import user_bp
+    from src.routes.subscription import subscription_bp
+    from src.routes.portfolio import portfolio_bp
+    from src.routes.property import property_bp
+    from src.routes.report import report_bp
+    from src.routes.data import data_bp
+    
+    for blueprint in (user_bp, subscription_bp, portfolio_bp, property_bp, report_bp, data_bp):
+        app.register_blueprint(blueprint, url_prefix='/api')
+
+def create_app():
+    """Build and configure the Flask application"""
+    app = GisoFlask(__name__)
+    
+    # Use environment variable for secret key in production
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'giso-invest-auth-secret-key-2024')
+    
+    # Enable CORS for all routes; browsers may cache preflight results for a day
+    CORS(app, origins="*", allow_headers=["Content-Type", "Authorization"], max_age=86400)
+    
+    # Blueprints also import the data models, so they must be registered before create_all()
+    _register_blueprints(app)
+    
+    # Database configuration - use environment variable for production
+    database_url = os.environ.get('DATABASE_URL')
+    if database_url:
+        # Production database (PostgreSQL)
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+        # Connections held per worker process; checked before use and recycled since idle ones can be dropped
+        # server-side, and a request waits at most pool_timeout seconds for one before failing fast
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+            'pool_pre_ping': True,
+            'pool_recycle': 1800,
+            'pool_timeout': 10
+        }
+    else:
+        # Development database (SQLite)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{_DB_PATH}"
+    
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    
+    # Create database tables
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', set_sqlite_pragmas)
+        db.create_all()
+    
+    @app.route('/')
+    def home():
+        """Home endpoint"""
+        return "GISO Invest Authentication Service is running", 200
+    
+    @app.route('/health')
+    def health_check():
+        """Health check endpoint"""
+        return {"status": "healthy", "service": "GISO Invest Authentication Service"}, 200
+    
+    return app
+
+app = create_app()
 
 if __name__ == '__main__':
     # Use environment variables for port and host in production
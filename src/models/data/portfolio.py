@@ -1,15 +1,20 @@
+from sqlalchemy import select
 from src.models.user import db
-from datetime import datetime
-import json
+from src.models.utils import JSONText, parse_datetime, utcnow
 
 class Portfolio(db.Model):
     """Portfolio model for storing user portfolios"""
+    # Same index the migration creates on existing databases; serves the per-user id lookups
+    __table_args__ = (
+        db.Index('idx_portfolio_user_id_id', 'user_id', 'id'),
+    )
+    
     id = db.Column(db.String(100), primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     name = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
     total_value = db.Column(db.Float, default=0.0)
     total_properties = db.Column(db.Integer, default=0)
     avg_roi = db.Column(db.Float, default=0.0)
@@ -17,51 +22,63 @@ class Portfolio(db.Model):
     is_public = db.Column(db.Boolean, default=False)
     
     # Store deal packages as JSON
-    deal_packages_json = db.Column(db.Text, nullable=True)
+    deal_packages = db.Column('deal_packages_json', JSONText, nullable=True)
     
-    # Relationships
-    user = db.relationship('User', backref=db.backref('portfolios', lazy=True))
+    # Columns for summary listings, leaving out the deal_packages JSON
+    SUMMARY_FIELDS = ('id', 'user_id', 'name', 'description', 'created_at', 'updated_at',
+                      'total_value', 'total_properties', 'avg_roi', 'share_id', 'is_public')
     
-    @property
-    def deal_packages(self):
-        """Get deal packages as Python objects"""
-        if not self.deal_packages_json:
-            return []
-        return json.loads(self.deal_packages_json)
+    # JSON columns with the empty value to_dict reports when they are NULL
+    JSON_FIELDS = {'deal_packages': list}
     
-    @deal_packages.setter
-    def deal_packages(self, packages):
-        """Set deal packages from Python objects"""
-        self.deal_packages_json = json.dumps(packages)
+    # Relationships
+    user = db.relationship('User', backref=db.backref('portfolios', lazy=True))
     
-    def calculate_stats(self):
-        """Calculate portfolio statistics"""
-        packages = self.deal_packages
-        
+    @staticmethod
+    def compute_stats(packages):
+        """Compute total value, property count and average ROI for a list of deal packages"""
         if not packages:
-            self.total_value = 0
-            self.total_properties = 0
-            self.avg_roi = 0
-            return
-        
-        total_value = sum(pkg.get('totalValue', 0) for pkg in packages)
-        total_properties = sum(len(pkg.get('properties', [])) for pkg in packages)
+            return {'total_value': 0, 'total_properties': 0, 'avg_roi': 0}
         
-        # Calculate average ROI
+        # Accumulate totals and ROI in a single pass over the packages
+        total_value = 0
+        total_properties = 0
         total_roi = 0
         property_count = 0
         
         for pkg in packages:
-            for prop in pkg.get('properties', []):
-                if 'roi' in prop and prop['roi'] is not None:
-                    total_roi += prop['roi']
+            props = pkg.get('properties', ())
+            total_value += pkg.get('totalValue', 0)
+            total_properties += len(props)
+            for prop in props:
+                roi = prop.get('roi')
+                if roi is not None:
+                    total_roi += roi
                     property_count += 1
         
-        avg_roi = total_roi / property_count if property_count > 0 else 0
-        
-        self.total_value = total_value
-        self.total_properties = total_properties
-        self.avg_roi = avg_roi
+        return {
+            'total_value': total_value,
+            'total_properties': total_properties,
+            'avg_roi': total_roi / property_count if property_count > 0 else 0
+        }
+    
+    def calculate_stats(self):
+        """Calculate portfolio statistics"""
+        stats = Portfolio.compute_stats(self.deal_packages)
+        self.total_value = stats['total_value']
+        self.total_properties = stats['total_properties']
+        self.avg_roi = stats['avg_roi']
+    
+    @staticmethod
+    def summary_query(user_id):
+        """Select the summary columns of a user's portfolios as plain rows"""
+        return select(*(getattr(Portfolio, field) for field in Portfolio.SUMMARY_FIELDS)).where(Portfolio.user_id == user_id)
+    
+    @staticmethod
+    def list_query(user_id):
+        """Select every field to_dict reports for a user's portfolios as plain rows, without building ORM objects"""
+        fields = Portfolio.SUMMARY_FIELDS + tuple(Portfolio.JSON_FIELDS)
+        return select(*(getattr(Portfolio, field) for field in fields)).where(Portfolio.user_id == user_id)
     
     def to_dict(self):
         """Convert portfolio to dictionary"""
@@ -70,43 +87,35 @@ class Portfolio(db.Model):
             'user_id': self.user_id,
             'name': self.name,
             'description': self.description,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
             'total_value': self.total_value,
             'total_properties': self.total_properties,
             'avg_roi': self.avg_roi,
             'share_id': self.share_id,
             'is_public': self.is_public,
-            'deal_packages': self.deal_packages
+            'deal_packages': self.deal_packages or []
+        }
+    
+    @staticmethod
+    def row_from_dict(data):
+        """Build the column values for a portfolio from a dictionary, e.g. for bulk inserts"""
+        # Stats are zero for an empty package list, so only real packages cost a walk
+        deal_packages = data.get('deal_packages')
+        return {
+            'id': data.get('id'),
+            'user_id': data.get('user_id'),
+            'name': data.get('name'),
+            'description': data.get('description'),
+            'share_id': data.get('share_id'),
+            'is_public': data.get('is_public', False),
+            'created_at': parse_datetime(data.get('created_at')),
+            'updated_at': parse_datetime(data.get('updated_at')),
+            'deal_packages': deal_packages,
+            **Portfolio.compute_stats(deal_packages)
         }
     
     @staticmethod
     def from_dict(data):
         """Create portfolio from dictionary"""
-        portfolio = Portfolio(
-            id=data.get('id'),
-            user_id=data.get('user_id'),
-            name=data.get('name'),
-            description=data.get('description'),
-            share_id=data.get('share_id'),
-            is_public=data.get('is_public', False)
-        )
-        
-        if 'created_at' in data and data['created_at']:
-            try:
-                portfolio.created_at = datetime.fromisoformat(data['created_at'])
-            except (ValueError, TypeError):
-                portfolio.created_at = datetime.utcnow()
-        
-        if 'updated_at' in data and data['updated_at']:
-            try:
-                portfolio.updated_at = datetime.fromisoformat(data['updated_at'])
-            except (ValueError, TypeError):
-                portfolio.updated_at = datetime.utcnow()
-        
-        if 'deal_packages' in data:
-            portfolio.deal_packages = data['deal_packages']
-        
-        portfolio.calculate_stats()
-        return portfolio
-
+        return Portfolio(**Portfolio.row_from_dict(data))
@@ -1,14 +1,19 @@
+from sqlalchemy import select
 from src.models.user import db
-from datetime import datetime
-import json
+from src.models.utils import JSONText, parse_datetime, utcnow
 
 class Property(db.Model):
     """Property model for storing analyzed properties"""
+    # Same index the migration creates on existing databases; serves the per-user id lookups
+    __table_args__ = (
+        db.Index('idx_property_user_id_id', 'user_id', 'id'),
+    )
+    
     id = db.Column(db.String(100), primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     address = db.Column(db.String(255), nullable=False)
-    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
     
     # Basic property details
     price = db.Column(db.Float, nullable=True)
@@ -20,35 +25,29 @@ class Property(db.Model):
     roi = db.Column(db.Float, nullable=True)
     
     # Store additional details as JSON
-    details_json = db.Column(db.Text, nullable=True)
-    analysis_json = db.Column(db.Text, nullable=True)
+    details = db.Column('details_json', JSONText, nullable=True)
+    analysis = db.Column('analysis_json', JSONText, nullable=True)
     
-    # Relationships
-    user = db.relationship('User', backref=db.backref('properties', lazy=True))
+    # Columns for summary listings, leaving out the details and analysis JSON
+    SUMMARY_FIELDS = ('id', 'user_id', 'address', 'created_at', 'updated_at', 'price', 'monthly_rent',
+                      'bedrooms', 'bathrooms', 'property_type', 'strategy', 'roi')
     
-    @property
-    def details(self):
-        """Get property details as Python object"""
-        if not self.details_json:
-            return {}
-        return json.loads(self.details_json)
+    # JSON columns with the empty value to_dict reports when they are NULL
+    JSON_FIELDS = {'details': dict, 'analysis': dict}
     
-    @details.setter
-    def details(self, details_data):
-        """Set property details from Python object"""
-        self.details_json = json.dumps(details_data)
+    # Relationships
+    user = db.relationship('User', backref=db.backref('properties', lazy=True))
     
-    @property
-    def analysis(self):
-        """Get property analysis as Python object"""
-        if not self.analysis_json:
-            return {}
-        return json.loads(self.analysis_json)
+    @staticmethod
+    def summary_query(user_id):
+        """Select the summary columns of a user's properties as plain rows"""
+        return select(*(getattr(Property, field) for field in Property.SUMMARY_FIELDS)).where(Property.user_id == user_id)
     
-    @analysis.setter
-    def analysis(self, analysis_data):
-        """Set property analysis from Python object"""
-        self.analysis_json = json.dumps(analysis_data)
+    @staticmethod
+    def list_query(user_id):
+        """Select every field to_dict reports for a user's properties as plain rows, without building ORM objects"""
+        fields = Property.SUMMARY_FIELDS + tuple(Property.JSON_FIELDS)
+        return select(*(getattr(Property, field) for field in fields)).where(Property.user_id == user_id)
     
     def to_dict(self):
         """Convert property to dictionary"""
@@ -56,8 +55,8 @@ class Property(db.Model):
             'id': self.id,
             'user_id': self.user_id,
             'address': self.address,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
             'price': self.price,
             'monthly_rent': self.monthly_rent,
             'bedrooms': self.bedrooms,
@@ -65,43 +64,31 @@ class Property(db.Model):
             'property_type': self.property_type,
             'strategy': self.strategy,
             'roi': self.roi,
-            'details': self.details,
-            'analysis': self.analysis
+            'details': self.details or {},
+            'analysis': self.analysis or {}
+        }
+    
+    @staticmethod
+    def row_from_dict(data):
+        """Build the column values for a property from a dictionary, e.g. for bulk inserts"""
+        return {
+            'id': data.get('id'),
+            'user_id': data.get('user_id'),
+            'address': data.get('address'),
+            'price': data.get('price'),
+            'monthly_rent': data.get('monthly_rent'),
+            'bedrooms': data.get('bedrooms'),
+            'bathrooms': data.get('bathrooms'),
+            'property_type': data.get('property_type'),
+            'strategy': data.get('strategy'),
+            'roi': data.get('roi'),
+            'created_at': parse_datetime(data.get('created_at')),
+            'updated_at': parse_datetime(data.get('updated_at')),
+            'details': data.get('details'),
+            'analysis': data.get('analysis')
         }
     
     @staticmethod
     def from_dict(data):
         """Create property from dictionary"""
-        property = Property(
-            id=data.get('id'),
-            user_id=data.get('user_id'),
-            address=data.get('address'),
-            price=data.get('price'),
-            monthly_rent=data.get('monthly_rent'),
-            bedrooms=data.get('bedrooms'),
-            bathrooms=data.get('bathrooms'),
-            property_type=data.get('property_type'),
-            strategy=data.get('strategy'),
-            roi=data.get('roi')
-        )
-        
-        if 'created_at' in data and data['created_at']:
-            try:
-                property.created_at = datetime.fromisoformat(data['created_at'])
-            except (ValueError, TypeError):
-                property.created_at = datetime.utcnow()
-        
-        if 'updated_at' in data and data['updated_at']:
-            try:
-                property.updated_at = datetime.fromisoformat(data['updated_at'])
-            except (ValueError, TypeError):
-                property.updated_at = datetime.utcnow()
-        
-        if 'details' in data:
-            property.details = data['details']
-        
-        if 'analysis' in data:
-            property.analysis = data['analysis']
-        
-        return property
-
+        return Property(**Property.row_from_dict(data))
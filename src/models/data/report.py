@@ -1,61 +1,73 @@
+from sqlalchemy import select
 from src.models.user import db
-from datetime import datetime
-import json
+from src.models.utils import JSONText, parse_datetime, utcnow
 
 class Report(db.Model):
     """Report model for storing user generated reports"""
+    # Same index the migration creates on existing databases; serves the per-user id lookups
+    __table_args__ = (
+        db.Index('idx_report_user_id_id', 'user_id', 'id'),
+    )
+    
     id = db.Column(db.String(100), primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     title = db.Column(db.String(255), nullable=False)
-    generated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    generated_at = db.Column(db.DateTime, nullable=False, default=utcnow)
     report_type = db.Column(db.String(50), nullable=False, default='investment_analysis')
     
     # Store report content and metadata as JSON
-    content_json = db.Column(db.Text, nullable=True)
-    properties_json = db.Column(db.Text, nullable=True)
+    content = db.Column('content_json', JSONText, nullable=True)
+    properties = db.Column('properties_json', JSONText, nullable=True)
     
     # Statistics
     property_count = db.Column(db.Integer, default=0)
     avg_roi = db.Column(db.Float, default=0.0)
     
-    # Relationships
-    user = db.relationship('User', backref=db.backref('reports', lazy=True))
-    
-    @property
-    def content(self):
-        """Get report content as Python object"""
-        if not self.content_json:
-            return {}
-        return json.loads(self.content_json)
+    # Columns for summary listings, leaving out the content and properties JSON
+    SUMMARY_FIELDS = ('id', 'user_id', 'title', 'generated_at', 'report_type', 'property_count', 'avg_roi')
     
-    @content.setter
-    def content(self, content_data):
-        """Set report content from Python object"""
-        self.content_json = json.dumps(content_data)
+    # JSON columns with the empty value to_dict reports when they are NULL
+    JSON_FIELDS = {'content': dict, 'properties': list}
     
-    @property
-    def properties(self):
-        """Get report properties as Python objects"""
-        if not self.properties_json:
-            return []
-        return json.loads(self.properties_json)
+    # Relationships
+    user = db.relationship('User', backref=db.backref('reports', lazy=True))
     
-    @properties.setter
-    def properties(self, properties_data):
-        """Set report properties from Python objects"""
-        self.properties_json = json.dumps(properties_data)
-        self.property_count = len(properties_data)
+    @staticmethod
+    def compute_stats(properties):
+        """Compute the property count and average ROI for a list of report properties"""
+        properties = properties or []
         
         # Calculate average ROI
         total_roi = 0
         property_count = 0
         
-        for prop in properties_data:
-            if 'roi' in prop and prop['roi'] is not None:
-                total_roi += prop['roi']
+        for prop in properties:
+            roi = prop.get('roi')
+            if roi is not None:
+                total_roi += roi
                 property_count += 1
         
-        self.avg_roi = total_roi / property_count if property_count > 0 else 0
+        return {
+            'property_count': len(properties),
+            'avg_roi': total_roi / property_count if property_count > 0 else 0
+        }
+    
+    def calculate_stats(self):
+        """Calculate report statistics"""
+        stats = Report.compute_stats(self.properties)
+        self.property_count = stats['property_count']
+        self.avg_roi = stats['avg_roi']
+    
+    @staticmethod
+    def summary_query(user_id):
+        """Select the summary columns of a user's reports as plain rows"""
+        return select(*(getattr(Report, field) for field in Report.SUMMARY_FIELDS)).where(Report.user_id == user_id)
+    
+    @staticmethod
+    def list_query(user_id):
+        """Select every field to_dict reports for a user's reports as plain rows, without building ORM objects"""
+        fields = Report.SUMMARY_FIELDS + tuple(Report.JSON_FIELDS)
+        return select(*(getattr(Report, field) for field in fields)).where(Report.user_id == user_id)
     
     def to_dict(self):
         """Convert report to dictionary"""
@@ -63,35 +75,31 @@ class Report(db.Model):
             'id': self.id,
             'user_id': self.user_id,
             'title': self.title,
-            'generated_at': self.generated_at.isoformat() if self.generated_at else None,
+            'generated_at': self.generated_at,
             'report_type': self.report_type,
             'property_count': self.property_count,
             'avg_roi': self.avg_roi,
-            'content': self.content,
-            'properties': self.properties
+            'content': self.content or {},
+            'properties': self.properties or []
+        }
+    
+    @staticmethod
+    def row_from_dict(data):
+        """Build the column values for a report from a dictionary, e.g. for bulk inserts"""
+        # Stats are always derived from the properties; counts sent by the client aren't trusted
+        properties = data.get('properties')
+        return {
+            'id': data.get('id'),
+            'user_id': data.get('user_id'),
+            'title': data.get('title'),
+            'report_type': data.get('report_type', 'investment_analysis'),
+            'generated_at': parse_datetime(data.get('generated_at')),
+            'content': data.get('content'),
+            'properties': properties,
+            **Report.compute_stats(properties)
         }
     
     @staticmethod
     def from_dict(data):
         """Create report from dictionary"""
-        report = Report(
-            id=data.get('id'),
-            user_id=data.get('user_id'),
-            title=data.get('title'),
-            report_type=data.get('report_type', 'investment_analysis')
-        )
-        
-        if 'generated_at' in data and data['generated_at']:
-            try:
-                report.generated_at = datetime.fromisoformat(data['generated_at'])
-            except (ValueError, TypeError):
-                report.generated_at = datetime.utcnow()
-        
-        if 'content' in data:
-            report.content = data['content']
-        
-        if 'properties' in data:
-            report.properties = data['properties']
-        
-        return report
-
+        return Report(**Report.row_from_dict(data))
@@ -1,22 +1,85 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import select, exists, lambda_stmt, true
+from sqlalchemy.orm import defer, reconstructor
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
-import secrets
-import jwt
+import hashlib
+import threading
+import time
 import os
+from cachetools import TLRUCache
+from src.models.utils import request_now
 
-db = SQLAlchemy()
+# JWT signing key, read once at import instead of on every token operation
+_SECRET_KEY = os.environ.get('SECRET_KEY', 'giso-invest-auth-secret-key-2024').encode()
+
+# Werkzeug hash method with explicit cost parameters, so ops can re-tune login latency per deployment
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+
+# last_login only needs to be this precise; skipping writes within the window keeps logins read-only
+LAST_LOGIN_RESOLUTION = timedelta(minutes=15)
+
+# Hash of a random password, built on first use, for timing-equalized checks against unknown accounts.
+# Its "method:params" prefix is also how Werkzeug spells PASSWORD_HASH_METHOD once defaults are filled in.
+_dummy_password_hash = None
+
+def _get_dummy_password_hash():
+    """Hash of a random password made with PASSWORD_HASH_METHOD, built once per process"""
+    global _dummy_password_hash
+    if _dummy_password_hash is None:
+        import secrets
+        _dummy_password_hash = _off_hub(generate_password_hash, secrets.token_urlsafe(16), PASSWORD_HASH_METHOD)
+    return _dummy_password_hash
+
+# Longest a verified JWT is trusted without re-checking its signature, in seconds, and how many are kept per worker
+JWT_CACHE_TTL = int(os.environ.get('JWT_CACHE_TTL', 30))
+JWT_CACHE_SIZE = int(os.environ.get('JWT_CACHE_SIZE', 10000))
+
+# Recently verified JWTs mapped to (user_id, exp), so repeat requests skip the signature check.
+# Keys are a SHA-256 prefix of the token so raw tokens never sit in memory; entries also drop out at the token's exp.
+_jwt_cache = TLRUCache(
+    maxsize=JWT_CACHE_SIZE,
+    ttu=lambda key, value, now: now + min(JWT_CACHE_TTL, value[1] - now),
+    timer=time.time
+)
+_jwt_cache_lock = threading.Lock()
+
+def _jwt_cache_key(token):
+    """Cache key for a raw JWT"""
+    return hashlib.sha256(token.encode()).digest()[:16]
+
+def invalidate_jwt_token(token):
+    """Forget a cached verification so the token's next use is checked from scratch"""
+    with _jwt_cache_lock:
+        _jwt_cache.pop(_jwt_cache_key(token), None)
+
+def _off_hub(func, *args):
+    """Run a CPU-bound hashing call in gevent's native threadpool, or inline outside a gevent worker"""
+    # scrypt releases the GIL, so the worker's other greenlets keep serving requests while it runs
+    try:
+        from gevent import monkey
+    except ImportError:
+        return func(*args)
+    if not monkey.is_module_patched('threading'):
+        return func(*args)
+    import gevent
+    return gevent.get_hub().threadpool.apply(func, args)
+
+# Sessions last one request, so objects keep their values after commit instead of re-SELECTing them
+# to build the response.
+db = SQLAlchemy(session_options={'expire_on_commit': False})
 
 class User(db.Model):
+    # Same index the migration creates on existing databases; serves trial range scans
+    __table_args__ = (
+        db.Index('idx_user_trial', 'trial_active', 'trial_end_date', 'subscription_status'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     
-    # Session management
-    session_token = db.Column(db.String(255), unique=True, nullable=True)
-    token_expires_at = db.Column(db.DateTime, nullable=True)
-    
     # Trial information
     trial_start_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     trial_end_date = db.Column(db.DateTime, nullable=False)
@@ -44,23 +107,49 @@ class User(db.Model):
     last_trial_check = db.Column(db.DateTime, default=datetime.utcnow)
 
     def __init__(self, username, email, password):
+        self._trial_status_cache = None
         self.username = username
         self.email = email
         self.set_password(password)
         self.initialize_trial()
 
+    @reconstructor
+    def init_on_load(self):
+        """Reset per-instance caches when a user is loaded from the database"""
+        self._trial_status_cache = None
+
     def set_password(self, password):
         """Hash and set the user's password"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = _off_hub(generate_password_hash, password, PASSWORD_HASH_METHOD)
 
     def check_password(self, password):
         """Check if the provided password matches the user's password"""
-        return check_password_hash(self.password_hash, password)
+        return _off_hub(check_password_hash, self.password_hash, password)
+
+    @staticmethod
+    def check_dummy_password(password):
+        """Spend the same hashing time as check_password without a user; always returns False"""
+        _off_hub(check_password_hash, _get_dummy_password_hash(), password)
+        return False
+
+    @staticmethod
+    def authenticate(identifier, password):
+        """Return the user matching a username/email and password, or None; one hash check runs either way"""
+        user = User.find_by_username_or_email(identifier)
+        password_ok = user.check_password(password) if user else User.check_dummy_password(password)
+        return user if password_ok else None
+
+    def password_needs_rehash(self):
+        """Check if the stored hash was made with a different method or cost than PASSWORD_HASH_METHOD"""
+        # Compare against a hash Werkzeug actually produced: a bare 'scrypt' or 'pbkdf2:sha256' setting
+        # is stored with its default cost parameters filled in
+        current_method = _get_dummy_password_hash().split('$', 1)[0]
+        return self.password_hash.split('$', 1)[0] != current_method
 
     def initialize_trial(self):
         """Initialize trial period for new user"""
-        self.trial_start_date = datetime.utcnow()
-        self.trial_end_date = datetime.utcnow() + timedelta(days=7)
+        self.trial_start_date = request_now()
+        self.trial_end_date = request_now() + timedelta(days=7)
         self.trial_days_used = 0
         self.trial_status = 'active'
         self.trial_active = True
@@ -70,7 +159,24 @@ class User(db.Model):
         self.payment_required = False
 
     def calculate_trial_status(self):
-        """Calculate current trial status"""
+        """Calculate current trial status, reusing the last result while the trial fields are unchanged"""
+        cache_key = (
+            self.trial_start_date,
+            self.trial_end_date,
+            self.trial_active,
+            self.subscription_status,
+            self.subscription_plan
+        )
+        cached = self._trial_status_cache
+        if cached is not None and cached[0] == cache_key:
+            return cached[1]
+        
+        trial_status = self._compute_trial_status()
+        self._trial_status_cache = (cache_key, trial_status)
+        return trial_status
+
+    def _compute_trial_status(self):
+        """Compute the trial status from the current field values"""
         if not self.trial_start_date:
             return {
                 'is_on_trial': False,
@@ -83,7 +189,7 @@ class User(db.Model):
                 'has_paid_subscription': False
             }
 
-        now = datetime.utcnow()
+        now = request_now()
         trial_end = self.trial_end_date or (self.trial_start_date + timedelta(days=7))
         
         time_remaining = trial_end - now
@@ -119,7 +225,7 @@ class User(db.Model):
         
         self.trial_days_used = 7 - trial_status['days_remaining']
         self.payment_required = trial_status['payment_required']
-        self.last_trial_check = datetime.utcnow()
+        self.last_trial_check = request_now()
         
         # Update subscription status based on trial
         if trial_status['is_expired'] and not trial_status['has_paid_subscription']:
@@ -144,9 +250,9 @@ class User(db.Model):
         self.plan = plan_id
         self.trial_active = False
         self.payment_required = False
-        self.subscription_start_date = datetime.utcnow()
-        self.last_payment_date = datetime.utcnow()
-        self.next_billing_date = datetime.utcnow() + timedelta(days=30)
+        self.subscription_start_date = request_now()
+        self.last_payment_date = request_now()
+        self.next_billing_date = request_now() + timedelta(days=30)
         
         if payment_data:
             self.stripe_customer_id = payment_data.get('customer_id')
@@ -162,58 +268,60 @@ class User(db.Model):
 
     def generate_jwt_token(self):
         """Generate a JWT token for the user"""
-        secret_key = os.environ.get('SECRET_KEY', 'giso-invest-auth-secret-key-2024')
+        import jwt  # deferred so workers don't load PyJWT until the first auth request
         
         payload = {
             'user_id': self.id,
             'username': self.username,
             'email': self.email,
-            'exp': datetime.utcnow() + timedelta(days=30),  # Token expires in 30 days
-            'iat': datetime.utcnow(),  # Issued at
+            'exp': request_now() + timedelta(days=30),  # Token expires in 30 days
+            'iat': request_now(),  # Issued at
             'sub': str(self.id)  # Subject (user ID)
         }
         
-        token = jwt.encode(payload, secret_key, algorithm='HS256')
+        token = jwt.encode(payload, _SECRET_KEY, algorithm='HS256')
         return token
 
-    def generate_session_token(self):
-        """Generate a new session token (legacy support)"""
-        self.session_token = secrets.token_urlsafe(32)
-        self.token_expires_at = datetime.utcnow() + timedelta(days=30)
-        return self.session_token
-
     @staticmethod
     def verify_jwt_token(token):
         """Verify and decode a JWT token"""
+        import jwt  # deferred so workers don't load PyJWT until the first auth request
+        
         try:
-            secret_key = os.environ.get('SECRET_KEY', 'giso-invest-auth-secret-key-2024')
-            payload = jwt.decode(token, secret_key, algorithms=['HS256'])
+            cache_key = _jwt_cache_key(token)
+            with _jwt_cache_lock:
+                cached = _jwt_cache.get(cache_key)
             
-            user_id = payload.get('user_id')
-            if not user_id:
-                return None
+            if cached:
+                user_id = cached[0]
+            else:
+                # Reject expired tokens from the unverified claims before paying for the signature check
+                exp = jwt.decode(token, options={'verify_signature': False}).get('exp')
+                if isinstance(exp, (int, float)) and exp <= time.time():
+                    return None
+                
+                payload = jwt.decode(token, _SECRET_KEY, algorithms=['HS256'])
+                
+                user_id = payload.get('user_id')
+                if not user_id:
+                    return None
+                
+                with _jwt_cache_lock:
+                    _jwt_cache[cache_key] = (user_id, payload.get('exp', 0))
             
-            user = User.query.get(user_id)
+            # Token-authenticated requests never check a password, so leave the hash unloaded
+            user = db.session.get(User, user_id, options=[defer(User.password_hash)])
             return user
         except jwt.ExpiredSignatureError:
             return None  # Token has expired
         except jwt.InvalidTokenError:
             return None  # Invalid token
 
-    def is_session_valid(self):
-        """Check if the current session token is valid"""
-        if not self.session_token or not self.token_expires_at:
-            return False
-        return datetime.utcnow() < self.token_expires_at
-
-    def invalidate_session(self):
-        """Invalidate the current session"""
-        self.session_token = None
-        self.token_expires_at = None
-
     def update_last_login(self):
-        """Update the last login timestamp"""
-        self.last_login = datetime.utcnow()
+        """Update the last login timestamp, at most once per LAST_LOGIN_RESOLUTION"""
+        now = request_now()
+        if not self.last_login or now - self.last_login > LAST_LOGIN_RESOLUTION:
+            self.last_login = now
 
     def get_trial_days_remaining(self):
         """Get the number of trial days remaining"""
@@ -228,8 +336,8 @@ class User(db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
-    def to_dict(self, include_sensitive=False):
-        """Convert user to dictionary"""
+    def to_dict(self, verbose=True):
+        """Convert user to dictionary; verbose=False leaves out the raw trial_calculation blob"""
         trial_status = self.calculate_trial_status()
         
         user_dict = {
@@ -238,39 +346,58 @@ class User(db.Model):
             'email': self.email,
             'trial_status': self.trial_status,
             'trial_active': self.trial_active,
-            'trial_start_date': self.trial_start_date.isoformat() if self.trial_start_date else None,
-            'trial_end_date': self.trial_end_date.isoformat() if self.trial_end_date else None,
+            'trial_start_date': self.trial_start_date,
+            'trial_end_date': self.trial_end_date,
             'trial_days_used': self.trial_days_used,
             'trial_days_remaining': trial_status['days_remaining'],
             'subscription_plan': self.subscription_plan,
             'subscription_status': self.subscription_status,
             'plan': self.plan,
-            'subscription_start_date': self.subscription_start_date.isoformat() if self.subscription_start_date else None,
-            'next_billing_date': self.next_billing_date.isoformat() if self.next_billing_date else None,
+            'subscription_start_date': self.subscription_start_date,
+            'next_billing_date': self.next_billing_date,
             'payment_required': trial_status['payment_required'],
             'can_access_app': trial_status['can_access'],
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'last_login': self.last_login.isoformat() if self.last_login else None,
-            'trial_calculation': trial_status
+            'created_at': self.created_at,
+            'last_login': self.last_login
         }
         
-        if include_sensitive:
-            user_dict.update({
-                'session_token': self.session_token,
-                'token_expires_at': self.token_expires_at.isoformat() if self.token_expires_at else None
-            })
+        if verbose:
+            user_dict['trial_calculation'] = trial_status
         
         return user_dict
 
     @staticmethod
-    def find_by_session_token(token):
-        """Find user by session token (legacy support)"""
-        return User.query.filter_by(session_token=token).first()
+    def active_trial_users():
+        """Query users whose trial is still running, as an indexed range scan on trial_end_date"""
+        return db.session.query(User).filter(
+            User.trial_active == True,
+            User.trial_end_date > request_now()
+        )
 
     @staticmethod
     def find_by_username_or_email(identifier):
         """Find user by username or email"""
-        return User.query.filter(
-            (User.username == identifier) | (User.email == identifier)
-        ).first()
+        # Two point lookups on the unique indexes instead of an OR across both columns.
+        # lambda_stmt builds each statement once per process; later logins only bind the identifier.
+        by_username = lambda_stmt(lambda: select(User).where(User.username == identifier).limit(1))
+        by_email = lambda_stmt(lambda: select(User).where(User.email == identifier).limit(1))
+        return db.session.scalars(by_username).first() or db.session.scalars(by_email).first()
 
+    @staticmethod
+    def find_taken_field(username=None, email=None, exclude_id=None):
+        """Return 'username' or 'email' for the first given value another account already uses, or None"""
+        # One round trip of EXISTS probes, each a single lookup on its column's unique index;
+        # avoids an OR across both columns, which planners often can't serve from the indexes
+        probes = {}
+        if username is not None:
+            probes['username'] = User.username == username
+        if email is not None:
+            probes['email'] = User.email == email
+        if not probes:
+            return None
+        
+        others = User.id != exclude_id if exclude_id is not None else true()
+        row = db.session.execute(
+            select(*(exists().where(condition, others).label(field) for field, condition in probes.items()))
+        ).one()
+        return next((field for field in probes if row._mapping[field]), None)
@@ -0,0 +1,50 @@
+from datetime import datetime, timezone
+from flask import g, has_request_context
+from sqlalchemy.types import Text, TypeDecorator
+import orjson
+
+
+def dump_json(value):
+    """Encode a Python object for storage in a JSON text column"""
+    return orjson.dumps(value).decode()
+
+
+class JSONText(TypeDecorator):
+    """JSON value stored in a TEXT column, encoded and decoded with orjson; None is stored as SQL NULL"""
+    # The *_json columns were created as TEXT. PostgreSQL drivers only decode json/jsonb columns themselves,
+    # so decoding here keeps those databases working without a column type migration.
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else dump_json(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else orjson.loads(value)
+
+
+def utcnow():
+    """Current UTC time as a naive datetime, matching how timestamps are stored"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def request_now():
+    """Current UTC time, read once per request so every timestamp in it agrees"""
+    if not has_request_context():
+        return utcnow()
+    if 'now' not in g:
+        g.now = utcnow()
+    return g.now
+
+
+def parse_datetime(value):
+    """Parse an ISO 8601 timestamp into naive UTC, falling back to the current time"""
+    if not value:
+        return utcnow()
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (ValueError, TypeError):
+        return utcnow()
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
@@ -1,16 +1,107 @@
-from flask import Blueprint, jsonify, request
-from flask_cors import cross_origin
+from flask import Blueprint, jsonify, current_app, stream_with_context
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import selectinload, raiseload
 from src.models.user import db
 from src.models.data.portfolio import Portfolio
 from src.models.data.property import Property
 from src.models.data.report import Report
-from src.routes.user import get_user_from_token
-from datetime import datetime
+from src.routes.user import get_user_from_token, json_body
+import secrets
 
 data_bp = Blueprint('data', __name__)
 
+def eager(query, *relationships):
+    """Eager-load the given relationships and make any other lazy load raise instead of querying"""
+    return query.options(*(selectinload(rel) for rel in relationships), raiseload('*'))
+
+# Rows fetched from the database per round-trip while streaming a list response
+STREAM_BATCH_SIZE = 200
+
+def list_rows(model, user_id, summary=False):
+    """Execute the user's list query and return an iterator of dicts, fetched STREAM_BATCH_SIZE rows at a time
+    
+    Both variants read plain rows rather than ORM objects; the full one fills NULL JSON columns like to_dict does.
+    """
+    query = model.summary_query(user_id) if summary else model.list_query(user_id)
+    rows = db.session.execute(query.execution_options(yield_per=STREAM_BATCH_SIZE)).mappings()
+    if summary:
+        return (dict(row) for row in rows)
+    json_fields = model.JSON_FIELDS.items()
+    return ({**row, **{field: row[field] or empty() for field, empty in json_fields}} for row in rows)
+
+def stream_list(key, items):
+    """Stream {"success": true, key: [...]} item by item instead of building the whole list and body in memory"""
+    dumps = current_app.json.dumps
+    
+    def generate():
+        yield f'{{"success":true,"{key}":['
+        for index, item in enumerate(items):
+            yield f',{dumps(item)}' if index else dumps(item)
+        yield ']}'
+    
+    return current_app.response_class(stream_with_context(generate()), status=200, mimetype='application/json')
+
+def new_id(prefix):
+    """Generate a prefixed random id; 16 random bytes as url-safe base64 are 22 chars instead of 32 hex"""
+    return f"{prefix}_{secrets.token_urlsafe(16)}"
+
+# INSERT constructs that support ON CONFLICT for the databases this service runs on
+_UPSERT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert
+}
+
+def insert_ignore(model):
+    """INSERT for the model that silently skips rows whose primary key already exists"""
+    insert = _UPSERT_INSERTS[db.session.get_bind().dialect.name]
+    return insert(model).on_conflict_do_nothing(index_elements=['id'])
+
+def rekeyed_row(model, row):
+    """Copy of an imported row under a fresh id; share links are unique too, so they are replaced and made private"""
+    row = {**row, 'id': new_id(model.__tablename__)}
+    if 'share_id' in row:
+        row['share_id'] = new_id("share")
+        row['is_public'] = False
+    return row
+
+def import_records(model, user_id, records, required_field):
+    """Bulk insert exported records the user doesn't have yet; returns (imported, skipped)"""
+    rows = []
+    seen = set()
+    
+    for record in records:
+        # Skip invalid data and repeats earlier in the payload
+        if 'id' not in record or required_field not in record or record['id'] in seen:
+            continue
+        seen.add(record['id'])
+        
+        row = model.row_from_dict(record)
+        row['user_id'] = user_id  # Ensure correct user ID
+        rows.append(row)
+    
+    if not rows:
+        return 0, len(records)
+    
+    # Ids that already exist are dropped by ON CONFLICT, so only new rows come back from RETURNING
+    inserted = set(db.session.execute(insert_ignore(model).returning(model.id), rows).scalars())
+    imported = len(inserted)
+    
+    # A conflicting id the user doesn't own belongs to someone else's record. Skipping it would drop the
+    # user's data, so store those records under fresh ids; the user's own duplicates stay skipped.
+    conflicts = [row for row in rows if row['id'] not in inserted]
+    if conflicts:
+        owned = set(db.session.execute(
+            select(model.id).where(model.user_id == user_id, model.id.in_([row['id'] for row in conflicts]))
+        ).scalars())
+        rekeyed = [rekeyed_row(model, row) for row in conflicts if row['id'] not in owned]
+        if rekeyed:
+            db.session.execute(insert_ignore(model), rekeyed)
+            imported += len(rekeyed)
+    
+    return imported, len(records) - imported
+
 @data_bp.route('/data/migrate', methods=['POST'])
-@cross_origin()
 def migrate_all_data():
     """Migrate all user data from localStorage to database"""
     try:
@@ -18,7 +109,7 @@ def migrate_all_data():
         if error_response:
             return jsonify(error_response), status_code
         
-        data = request.get_json()
+        data = json_body()
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
@@ -28,68 +119,16 @@ def migrate_all_data():
             'reports': {'imported': 0, 'skipped': 0}
         }
         
-        # Migrate properties
-        if 'properties' in data and isinstance(data['properties'], list):
-            for property_data in data['properties']:
-                # Skip invalid data
-                if 'id' not in property_data or 'address' not in property_data:
-                    results['properties']['skipped'] += 1
-                    continue
-                
-                # Check if property already exists
-                existing = Property.query.filter_by(id=property_data['id'], user_id=user.id).first()
-                if existing:
-                    results['properties']['skipped'] += 1
-                    continue
-                
-                # Create property from imported data
-                property = Property.from_dict(property_data)
-                property.user_id = user.id  # Ensure correct user ID
-                
-                db.session.add(property)
-                results['properties']['imported'] += 1
-        
-        # Migrate portfolios
-        if 'portfolios' in data and isinstance(data['portfolios'], list):
-            for portfolio_data in data['portfolios']:
-                # Skip invalid data
-                if 'id' not in portfolio_data or 'name' not in portfolio_data:
-                    results['portfolios']['skipped'] += 1
-                    continue
-                
-                # Check if portfolio already exists
-                existing = Portfolio.query.filter_by(id=portfolio_data['id'], user_id=user.id).first()
-                if existing:
-                    results['portfolios']['skipped'] += 1
-                    continue
-                
-                # Create portfolio from imported data
-                portfolio = Portfolio.from_dict(portfolio_data)
-                portfolio.user_id = user.id  # Ensure correct user ID
-                
-                db.session.add(portfolio)
-                results['portfolios']['imported'] += 1
-        
-        # Migrate reports
-        if 'reports' in data and isinstance(data['reports'], list):
-            for report_data in data['reports']:
-                # Skip invalid data
-                if 'id' not in report_data or 'title' not in report_data:
-                    results['reports']['skipped'] += 1
-                    continue
-                
-                # Check if report already exists
-                existing = Report.query.filter_by(id=report_data['id'], user_id=user.id).first()
-                if existing:
-                    results['reports']['skipped'] += 1
-                    continue
-                
-                # Create report from imported data
-                report = Report.from_dict(report_data)
-                report.user_id = user.id  # Ensure correct user ID
-                
-                db.session.add(report)
-                results['reports']['imported'] += 1
+        # Migrate each entity type with one bulk insert that skips existing ids
+        for key, model, required_field in (
+            ('properties', Property, 'address'),
+            ('portfolios', Portfolio, 'name'),
+            ('reports', Report, 'title')
+        ):
+            if key in data and isinstance(data[key], list):
+                imported, skipped = import_records(model, user.id, data[key], required_field)
+                results[key]['imported'] += imported
+                results[key]['skipped'] += skipped
         
         db.session.commit()
         
@@ -104,7 +143,6 @@ def migrate_all_data():
         return jsonify({'error': f'Failed to migrate data: {str(e)}'}), 500
 
 @data_bp.route('/data/stats', methods=['GET'])
-@cross_origin()
 def get_user_stats():
     """Get user data statistics"""
     try:
@@ -112,36 +150,23 @@ def get_user_stats():
         if error_response:
             return jsonify(error_response), status_code
         
-        # Count properties
-        property_count = Property.query.filter_by(user_id=user.id).count()
-        
-        # Count portfolios
-        portfolio_count = Portfolio.query.filter_by(user_id=user.id).count()
-        
-        # Count reports
-        report_count = Report.query.filter_by(user_id=user.id).count()
-        
-        # Calculate total value and average ROI
-        total_value = 0
-        total_roi = 0
-        roi_count = 0
-        
-        properties = Property.query.filter_by(user_id=user.id).all()
-        for prop in properties:
-            if prop.price:
-                total_value += prop.price
-            
-            if prop.roi is not None:
-                total_roi += prop.roi
-                roi_count += 1
-        
-        avg_roi = total_roi / roi_count if roi_count > 0 else 0
-        
-        # Count deal packages
+        # Aggregate property value and ROI, plus the report count as a scalar subquery, in one round trip
+        report_count_query = select(func.count(Report.id)).where(Report.user_id == user.id).scalar_subquery()
+        property_count, total_value, avg_roi, report_count = db.session.query(
+            func.count(Property.id),
+            func.coalesce(func.sum(Property.price), 0),
+            func.avg(Property.roi),
+            report_count_query
+        ).filter(Property.user_id == user.id).one()
+        avg_roi = avg_roi or 0
+        
+        # Count portfolios and their deal packages, loading only the JSON column
+        portfolio_count = 0
         deal_package_count = 0
-        portfolios = Portfolio.query.filter_by(user_id=user.id).all()
-        for portfolio in portfolios:
-            deal_package_count += len(portfolio.deal_packages)
+        rows = db.session.query(Portfolio.deal_packages).filter(Portfolio.user_id == user.id).yield_per(1000)
+        for deal_packages, in rows:
+            portfolio_count += 1
+            deal_package_count += len(deal_packages or [])
         
         return jsonify({
             'success': True,
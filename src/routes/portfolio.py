@@ -1,15 +1,15 @@
-from flask import Blueprint, jsonify, request
-from flask_cors import cross_origin
+from flask import Blueprint, jsonify
 from src.models.user import db
 from src.models.data.portfolio import Portfolio
-from src.routes.user import get_user_from_token
-import uuid
-from datetime import datetime
+from src.routes.user import get_user_from_token, json_body, flag_arg
+from src.routes.data import import_records, list_rows, stream_list, insert_ignore, rekeyed_row, eager, new_id
 
 portfolio_bp = Blueprint('portfolio', __name__)
 
+# Upper bound on sub-requests in one /portfolios:batch call
+MAX_BATCH_OPS = 100
+
 @portfolio_bp.route('/portfolios', methods=['GET'])
-@cross_origin()
 def get_portfolios():
     """Get all portfolios for the current user"""
     try:
@@ -17,17 +17,16 @@ def get_portfolios():
         if error_response:
             return jsonify(error_response), status_code
         
-        portfolios = Portfolio.query.filter_by(user_id=user.id).all()
-        return jsonify({
-            'success': True,
-            'portfolios': [portfolio.to_dict() for portfolio in portfolios]
-        }), 200
+        # ?summary=1 skips the JSON columns and ORM objects for lightweight list views.
+        # The query runs here so errors still get a 500; rows are then fetched and encoded as the body streams.
+        portfolios = list_rows(Portfolio, user.id, summary=flag_arg('summary'))
+        
+        return stream_list('portfolios', portfolios)
         
     except Exception as e:
         return jsonify({'error': f'Failed to get portfolios: {str(e)}'}), 500
 
 @portfolio_bp.route('/portfolios/<string:portfolio_id>', methods=['GET'])
-@cross_origin()
 def get_portfolio(portfolio_id):
     """Get a specific portfolio by ID"""
     try:
@@ -35,7 +34,7 @@ def get_portfolio(portfolio_id):
         if error_response:
             return jsonify(error_response), status_code
         
-        portfolio = Portfolio.query.filter_by(id=portfolio_id, user_id=user.id).first()
+        portfolio = eager(Portfolio.query).filter_by(id=portfolio_id, user_id=user.id).first()
         if not portfolio:
             return jsonify({'error': 'Portfolio not found'}), 404
         
@@ -47,8 +46,69 @@ def get_portfolio(portfolio_id):
     except Exception as e:
         return jsonify({'error': f'Failed to get portfolio: {str(e)}'}), 500
 
+def _create_portfolio(user, data):
+    """Validate and add a new portfolio to the session without committing; returns (portfolio, error, status)"""
+    if not data:
+        return None, {'error': 'No data provided'}, 400
+    
+    name = data.get('name', '').strip()
+    description = data.get('description', '').strip()
+    
+    if not name:
+        return None, {'error': 'Portfolio name is required'}, 400
+    
+    # Generate unique IDs
+    portfolio_id = new_id("portfolio")
+    share_id = new_id("share")
+    
+    # Create new portfolio
+    portfolio = Portfolio(
+        id=portfolio_id,
+        user_id=user.id,
+        name=name,
+        description=description,
+        share_id=share_id,
+        is_public=False
+    )
+    
+    # Set deal packages if provided
+    if 'deal_packages' in data:
+        portfolio.deal_packages = data['deal_packages']
+        portfolio.calculate_stats()
+    
+    db.session.add(portfolio)
+    return portfolio, None, 201
+
+def _update_portfolio(user, portfolio_id, data):
+    """Apply an update to one of the user's portfolios without committing; returns (portfolio, error, status)"""
+    portfolio = Portfolio.query.filter_by(id=portfolio_id, user_id=user.id).first()
+    if not portfolio:
+        return None, {'error': 'Portfolio not found'}, 404
+    
+    if not data:
+        return None, {'error': 'No data provided'}, 400
+    
+    # Update basic fields
+    if 'name' in data:
+        portfolio.name = data['name'].strip()
+    
+    if 'description' in data:
+        portfolio.description = data['description'].strip()
+    
+    if 'is_public' in data:
+        portfolio.is_public = data['is_public']
+        
+        # Generate new share ID when making public
+        if portfolio.is_public and not portfolio.share_id:
+            portfolio.share_id = new_id("share")
+    
+    # Update deal packages if provided; stats only need recomputing when the packages actually differ
+    if 'deal_packages' in data and data['deal_packages'] != portfolio.deal_packages:
+        portfolio.deal_packages = data['deal_packages']
+        portfolio.calculate_stats()
+    return portfolio, None, 200
+
 @portfolio_bp.route('/portfolios', methods=['POST'])
-@cross_origin()
 def create_portfolio():
     """Create a new portfolio"""
     try:
@@ -56,38 +116,10 @@ def create_portfolio():
         if error_response:
             return jsonify(error_response), status_code
         
-        data = request.get_json()
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
+        portfolio, error_response, status_code = _create_portfolio(user, json_body())
+        if error_response:
+            return jsonify(error_response), status_code
         
-        name = data.get('name', '').strip()
-        description = data.get('description', '').strip()
-        
-        if not name:
-            return jsonify({'error': 'Portfolio name is required'}), 400
-        
-        # Generate unique IDs
-        portfolio_id = f"portfolio_{uuid.uuid4().hex}"
-        share_id = f"share_{uuid.uuid4().hex}"
-        
-        # Create new portfolio
-        portfolio = Portfolio(
-            id=portfolio_id,
-            user_id=user.id,
-            name=name,
-            description=description,
-            share_id=share_id,
-            is_public=False,
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow()
-        )
-        
-        # Set deal packages if provided
-        if 'deal_packages' in data:
-            portfolio.deal_packages = data['deal_packages']
-            portfolio.calculate_stats()
-        
-        db.session.add(portfolio)
         db.session.commit()
         
         return jsonify({
@@ -101,7 +133,6 @@ def create_portfolio():
         return jsonify({'error': f'Failed to create portfolio: {str(e)}'}), 500
 
 @portfolio_bp.route('/portfolios/<string:portfolio_id>', methods=['PUT'])
-@cross_origin()
 def update_portfolio(portfolio_id):
     """Update an existing portfolio"""
     try:
@@ -109,35 +140,13 @@ def update_portfolio(portfolio_id):
         if error_response:
             return jsonify(error_response), status_code
         
-        portfolio = Portfolio.query.filter_by(id=portfolio_id, user_id=user.id).first()
-        if not portfolio:
-            return jsonify({'error': 'Portfolio not found'}), 404
-        
-        data = request.get_json()
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-        
-        # Update basic fields
-        if 'name' in data:
-            portfolio.name = data['name'].strip()
-        
-        if 'description' in data:
-            portfolio.description = data['description'].strip()
-        
-        if 'is_public' in data:
-            portfolio.is_public = data['is_public']
-            
-            # Generate new share ID when making public
-            if portfolio.is_public and not portfolio.share_id:
-                portfolio.share_id = f"share_{uuid.uuid4().hex}"
-        
-        # Update deal packages if provided
-        if 'deal_packages' in data:
-            portfolio.deal_packages = data['deal_packages']
-            portfolio.calculate_stats()
+        portfolio, error_response, status_code = _update_portfolio(user, portfolio_id, json_body())
+        if error_response:
+            return jsonify(error_response), status_code
         
-        portfolio.updated_at = datetime.utcnow()
-        db.session.commit()
+        # Setting attributes to their current values leaves nothing to write, so skip the commit
+        if db.session.is_modified(portfolio):
+            db.session.commit()
         
         return jsonify({
             'success': True,
@@ -150,7 +159,6 @@ def update_portfolio(portfolio_id):
         return jsonify({'error': f'Failed to update portfolio: {str(e)}'}), 500
 
 @portfolio_bp.route('/portfolios/<string:portfolio_id>', methods=['DELETE'])
-@cross_origin()
 def delete_portfolio(portfolio_id):
     """Delete a portfolio"""
     try:
@@ -174,12 +182,60 @@ def delete_portfolio(portfolio_id):
         db.session.rollback()
         return jsonify({'error': f'Failed to delete portfolio: {str(e)}'}), 500
 
+@portfolio_bp.route('/portfolios:batch', methods=['POST'])
+def batch_portfolios():
+    """Apply several portfolio creates/updates in one request and one transaction
+    
+    Body: {"ops": [{"method": "POST", "body": {...}}, {"method": "PUT", "id": "...", "body": {...}}]}.
+    Each op gets its own status in "results"; ops that fail validation change nothing, the rest commit together.
+    """
+    try:
+        user, error_response, status_code = get_user_from_token()
+        if error_response:
+            return jsonify(error_response), status_code
+        
+        data = json_body()
+        ops = data.get('ops') if data else None
+        if not isinstance(ops, list) or not ops:
+            return jsonify({'error': 'No operations provided'}), 400
+        if len(ops) > MAX_BATCH_OPS:
+            return jsonify({'error': f'At most {MAX_BATCH_OPS} operations per batch'}), 400
+        
+        outcomes = []
+        for op in ops:
+            method = op.get('method', '').upper() if isinstance(op, dict) else ''
+            if method == 'POST':
+                outcomes.append(_create_portfolio(user, op.get('body')))
+            elif method == 'PUT':
+                outcomes.append(_update_portfolio(user, op.get('id'), op.get('body')))
+            else:
+                outcomes.append((None, {'error': 'Unsupported operation'}, 405))
+        
+        db.session.commit()
+        
+        results = []
+        for portfolio, error_response, status_code in outcomes:
+            if error_response:
+                results.append({'status': status_code, **error_response})
+                continue
+            results.append({'status': status_code, 'portfolio': portfolio.to_dict()})
+        
+        return jsonify({
+            'success': True,
+            'results': results
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to apply portfolio batch: {str(e)}'}), 500
+
 @portfolio_bp.route('/portfolios/share/<string:share_id>', methods=['GET'])
-@cross_origin()
 def get_shared_portfolio(share_id):
     """Get a shared portfolio by share ID"""
     try:
-        portfolio = Portfolio.query.filter_by(share_id=share_id, is_public=True).first()
+        # Read on every request rather than cached per worker, so a portfolio made private or deleted
+        # stops being served at once; the lookup is a single probe on the public share_id index
+        portfolio = eager(Portfolio.query).filter_by(share_id=share_id, is_public=True).first()
         if not portfolio:
             return jsonify({'error': 'Shared portfolio not found'}), 404
         
@@ -192,7 +248,6 @@ def get_shared_portfolio(share_id):
         return jsonify({'error': f'Failed to get shared portfolio: {str(e)}'}), 500
 
 @portfolio_bp.route('/portfolios/import', methods=['POST'])
-@cross_origin()
 def import_portfolio():
     """Import a portfolio from localStorage data"""
     try:
@@ -200,7 +255,7 @@ def import_portfolio():
         if error_response:
             return jsonify(error_response), status_code
         
-        data = request.get_json()
+        data = json_body()
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
@@ -208,16 +263,20 @@ def import_portfolio():
         if 'id' not in data or 'name' not in data:
             return jsonify({'error': 'Invalid portfolio data'}), 400
         
-        # Check if portfolio already exists
-        existing = Portfolio.query.filter_by(id=data['id'], user_id=user.id).first()
-        if existing:
-            return jsonify({'error': 'Portfolio already exists', 'portfolio': existing.to_dict()}), 409
+        # Insert the imported portfolio unless the id is taken; no separate existence check on the happy path
+        row = Portfolio.row_from_dict(data)
+        row['user_id'] = user.id  # Ensure correct user ID
+        portfolio = db.session.execute(insert_ignore(Portfolio).returning(Portfolio), [row]).scalar_one_or_none()
         
-        # Create portfolio from imported data
-        portfolio = Portfolio.from_dict(data)
-        portfolio.user_id = user.id  # Ensure correct user ID
+        if portfolio is None:
+            existing = Portfolio.query.filter_by(id=data['id'], user_id=user.id).first()
+            if existing:
+                return jsonify({'error': 'Portfolio already exists', 'portfolio': existing.to_dict()}), 409
+            
+            # The id belongs to another user's portfolio; import under a fresh id rather than refuse the data
+            row = rekeyed_row(Portfolio, row)
+            portfolio = db.session.execute(insert_ignore(Portfolio).returning(Portfolio), [row]).scalar_one()
         
-        db.session.add(portfolio)
         db.session.commit()
         
         return jsonify({
@@ -231,7 +290,6 @@ def import_portfolio():
         return jsonify({'error': f'Failed to import portfolio: {str(e)}'}), 500
 
 @portfolio_bp.route('/portfolios/migrate', methods=['POST'])
-@cross_origin()
 def migrate_portfolios():
     """Migrate portfolios from localStorage to database"""
     try:
@@ -239,7 +297,7 @@ def migrate_portfolios():
         if error_response:
             return jsonify(error_response), status_code
         
-        data = request.get_json()
+        data = json_body()
         if not data or 'portfolios' not in data:
             return jsonify({'error': 'No portfolios provided'}), 400
         
@@ -247,27 +305,7 @@ def migrate_portfolios():
         if not isinstance(portfolios, list):
             return jsonify({'error': 'Portfolios must be a list'}), 400
         
-        imported_count = 0
-        skipped_count = 0
-        
-        for portfolio_data in portfolios:
-            # Skip invalid data
-            if 'id' not in portfolio_data or 'name' not in portfolio_data:
-                skipped_count += 1
-                continue
-            
-            # Check if portfolio already exists
-            existing = Portfolio.query.filter_by(id=portfolio_data['id'], user_id=user.id).first()
-            if existing:
-                skipped_count += 1
-                continue
-            
-            # Create portfolio from imported data
-            portfolio = Portfolio.from_dict(portfolio_data)
-            portfolio.user_id = user.id  # Ensure correct user ID
-            
-            db.session.add(portfolio)
-            imported_count += 1
+        imported_count, skipped_count = import_records(Portfolio, user.id, portfolios, 'name')
         
         db.session.commit()
         
@@ -1,15 +1,12 @@
-from flask import Blueprint, jsonify, request
-from flask_cors import cross_origin
+from flask import Blueprint, jsonify
 from src.models.user import db
 from src.models.data.property import Property
-from src.routes.user import get_user_from_token
-import uuid
-from datetime import datetime
+from src.routes.user import get_user_from_token, json_body, flag_arg
+from src.routes.data import import_records, list_rows, stream_list, eager, new_id
 
 property_bp = Blueprint('property', __name__)
 
 @property_bp.route('/properties', methods=['GET'])
-@cross_origin()
 def get_properties():
     """Get all properties for the current user"""
     try:
@@ -17,17 +14,16 @@ def get_properties():
         if error_response:
             return jsonify(error_response), status_code
         
-        properties = Property.query.filter_by(user_id=user.id).all()
-        return jsonify({
-            'success': True,
-            'properties': [prop.to_dict() for prop in properties]
-        }), 200
+        # ?summary=1 skips the JSON columns and ORM objects for lightweight list views.
+        # The query runs here so errors still get a 500; rows are then fetched and encoded as the body streams.
+        properties = list_rows(Property, user.id, summary=flag_arg('summary'))
+        
+        return stream_list('properties', properties)
         
     except Exception as e:
         return jsonify({'error': f'Failed to get properties: {str(e)}'}), 500
 
 @property_bp.route('/properties/<string:property_id>', methods=['GET'])
-@cross_origin()
 def get_property(property_id):
     """Get a specific property by ID"""
     try:
@@ -35,7 +31,7 @@ def get_property(property_id):
         if error_response:
             return jsonify(error_response), status_code
         
-        property = Property.query.filter_by(id=property_id, user_id=user.id).first()
+        property = eager(Property.query).filter_by(id=property_id, user_id=user.id).first()
         if not property:
             return jsonify({'error': 'Property not found'}), 404
         
@@ -48,7 +44,6 @@ def get_property(property_id):
         return jsonify({'error': f'Failed to get property: {str(e)}'}), 500
 
 @property_bp.route('/properties', methods=['POST'])
-@cross_origin()
 def create_property():
     """Create a new property"""
     try:
@@ -56,7 +51,7 @@ def create_property():
         if error_response:
             return jsonify(error_response), status_code
         
-        data = request.get_json()
+        data = json_body()
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
@@ -66,7 +61,7 @@ def create_property():
             return jsonify({'error': 'Property address is required'}), 400
         
         # Generate unique ID
-        property_id = f"property_{uuid.uuid4().hex}"
+        property_id = new_id("property")
         
         # Create new property
         property = Property(
@@ -79,9 +74,7 @@ def create_property():
             bathrooms=data.get('bathrooms'),
             property_type=data.get('property_type'),
             strategy=data.get('strategy'),
-            roi=data.get('roi'),
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow()
+            roi=data.get('roi')
         )
         
         # Set details if provided
@@ -106,7 +99,6 @@ def create_property():
         return jsonify({'error': f'Failed to create property: {str(e)}'}), 500
 
 @property_bp.route('/properties/<string:property_id>', methods=['PUT'])
-@cross_origin()
 def update_property(property_id):
     """Update an existing property"""
     try:
@@ -118,7 +110,7 @@ def update_property(property_id):
         if not property:
             return jsonify({'error': 'Property not found'}), 404
         
-        data = request.get_json()
+        data = json_body()
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
@@ -155,8 +147,9 @@ def update_property(property_id):
         if 'analysis' in data:
             property.analysis = data['analysis']
         
-        property.updated_at = datetime.utcnow()
-        db.session.commit()
+        # Setting attributes to their current values leaves nothing to write, so skip the commit
+        if db.session.is_modified(property):
+            db.session.commit()
         
         return jsonify({
             'success': True,
@@ -169,7 +162,6 @@ def update_property(property_id):
         return jsonify({'error': f'Failed to update property: {str(e)}'}), 500
 
 @property_bp.route('/properties/<string:property_id>', methods=['DELETE'])
-@cross_origin()
 def delete_property(property_id):
     """Delete a property"""
     try:
@@ -194,7 +186,6 @@ def delete_property(property_id):
         return jsonify({'error': f'Failed to delete property: {str(e)}'}), 500
 
 @property_bp.route('/properties/migrate', methods=['POST'])
-@cross_origin()
 def migrate_properties():
     """Migrate properties from localStorage to database"""
     try:
@@ -202,7 +193,7 @@ def migrate_properties():
         if error_response:
             return jsonify(error_response), status_code
         
-        data = request.get_json()
+        data = json_body()
         if not data or 'properties' not in data:
             return jsonify({'error': 'No properties provided'}), 400
         
@@ -210,27 +201,7 @@ def migrate_properties():
         if not isinstance(properties, list):
             return jsonify({'error': 'Properties must be a list'}), 400
         
-        imported_count = 0
-        skipped_count = 0
-        
-        for property_data in properties:
-            # Skip invalid data
-            if 'id' not in property_data or 'address' not in property_data:
-                skipped_count += 1
-                continue
-            
-            # Check if property already exists
-            existing = Property.query.filter_by(id=property_data['id'], user_id=user.id).first()
-            if existing:
-                skipped_count += 1
-                continue
-            
-            # Create property from imported data
-            property = Property.from_dict(property_data)
-            property.user_id = user.id  # Ensure correct user ID
-            
-            db.session.add(property)
-            imported_count += 1
+        imported_count, skipped_count = import_records(Property, user.id, properties, 'address')
         
         db.session.commit()
         
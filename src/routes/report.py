@@ -1,15 +1,12 @@
-from flask import Blueprint, jsonify, request
-from flask_cors import cross_origin
+from flask import Blueprint, jsonify
 from src.models.user import db
 from src.models.data.report import Report
-from src.routes.user import get_user_from_token
-import uuid
-from datetime import datetime
+from src.routes.user import get_user_from_token, json_body, flag_arg
+from src.routes.data import import_records, list_rows, stream_list, eager, new_id
 
 report_bp = Blueprint('report', __name__)
 
 @report_bp.route('/reports', methods=['GET'])
-@cross_origin()
 def get_reports():
     """Get all reports for the current user"""
     try:
@@ -17,17 +14,16 @@ def get_reports():
         if error_response:
             return jsonify(error_response), status_code
         
-        reports = Report.query.filter_by(user_id=user.id).all()
-        return jsonify({
-            'success': True,
-            'reports': [report.to_dict() for report in reports]
-        }), 200
+        # ?summary=1 skips the JSON columns and ORM objects for lightweight list views.
+        # The query runs here so errors still get a 500; rows are then fetched and encoded as the body streams.
+        reports = list_rows(Report, user.id, summary=flag_arg('summary'))
+        
+        return stream_list('reports', reports)
         
     except Exception as e:
         return jsonify({'error': f'Failed to get reports: {str(e)}'}), 500
 
 @report_bp.route('/reports/<string:report_id>', methods=['GET'])
-@cross_origin()
 def get_report(report_id):
     """Get a specific report by ID"""
     try:
@@ -35,7 +31,7 @@ def get_report(report_id):
         if error_response:
             return jsonify(error_response), status_code
         
-        report = Report.query.filter_by(id=report_id, user_id=user.id).first()
+        report = eager(Report.query).filter_by(id=report_id, user_id=user.id).first()
         if not report:
             return jsonify({'error': 'Report not found'}), 404
         
@@ -48,7 +44,6 @@ def get_report(report_id):
         return jsonify({'error': f'Failed to get report: {str(e)}'}), 500
 
 @report_bp.route('/reports', methods=['POST'])
-@cross_origin()
 def create_report():
     """Create a new report"""
     try:
@@ -56,7 +51,7 @@ def create_report():
         if error_response:
             return jsonify(error_response), status_code
         
-        data = request.get_json()
+        data = json_body()
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
@@ -67,15 +62,14 @@ def create_report():
             return jsonify({'error': 'Report title is required'}), 400
         
         # Generate unique ID
-        report_id = f"report_{uuid.uuid4().hex}"
+        report_id = new_id("report")
         
         # Create new report
         report = Report(
             id=report_id,
             user_id=user.id,
             title=title,
-            report_type=report_type,
-            generated_at=datetime.utcnow()
+            report_type=report_type
         )
         
         # Set content if provided
@@ -85,6 +79,7 @@ def create_report():
         # Set properties if provided
         if 'properties' in data:
             report.properties = data['properties']
+            report.calculate_stats()
         
         db.session.add(report)
         db.session.commit()
@@ -100,7 +95,6 @@ def create_report():
         return jsonify({'error': f'Failed to create report: {str(e)}'}), 500
 
 @report_bp.route('/reports/<string:report_id>', methods=['DELETE'])
-@cross_origin()
 def delete_report(report_id):
     """Delete a report"""
     try:
@@ -125,7 +119,6 @@ def delete_report(report_id):
         return jsonify({'error': f'Failed to delete report: {str(e)}'}), 500
 
 @report_bp.route('/reports/migrate', methods=['POST'])
-@cross_origin()
 def migrate_reports():
     """Migrate reports from localStorage to database"""
     try:
@@ -133,7 +126,7 @@ def migrate_reports():
         if error_response:
             return jsonify(error_response), status_code
         
-        data = request.get_json()
+        data = json_body()
         if not data or 'reports' not in data:
             return jsonify({'error': 'No reports provided'}), 400
         
@@ -141,27 +134,7 @@ def migrate_reports():
         if not isinstance(reports, list):
             return jsonify({'error': 'Reports must be a list'}), 400
         
-        imported_count = 0
-        skipped_count = 0
-        
-        for report_data in reports:
-            # Skip invalid data
-            if 'id' not in report_data or 'title' not in report_data:
-                skipped_count += 1
-                continue
-            
-            # Check if report already exists
-            existing = Report.query.filter_by(id=report_data['id'], user_id=user.id).first()
-            if existing:
-                skipped_count += 1
-                continue
-            
-            # Create report from imported data
-            report = Report.from_dict(report_data)
-            report.user_id = user.id  # Ensure correct user ID
-            
-            db.session.add(report)
-            imported_count += 1
+        imported_count, skipped_count = import_records(Report, user.id, reports, 'title')
         
         db.session.commit()
         
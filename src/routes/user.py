@@ -1,15 +1,33 @@
-from flask import Blueprint, jsonify, request
-from flask_cors import cross_origin
-from src.models.user import User, db
+from flask import Blueprint, jsonify, request, g, current_app, stream_with_context
+from functools import wraps
+from sqlalchemy.orm import defer
+from src.models.user import User, db, invalidate_jwt_token
 from datetime import datetime
 import re
 
 user_bp = Blueprint('user', __name__)
 
+# Longest bearer token accepted; the JWTs issued here are a few hundred bytes
+MAX_TOKEN_LENGTH = 4096
+
+# Compiled once at import; validate_email runs on every register and profile update
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+# Users loaded per round-trip while streaming the legacy /users listing
+USERS_PAGE_SIZE = 500
+
+# Input bounds, checked before any regex or database work; the first two match the user table's columns,
+# and the email limit sits inside the 254 characters RFC 5321 allows
+MAX_USERNAME_LENGTH = 80
+MAX_EMAIL_LENGTH = 120
+MAX_PASSWORD_LENGTH = 128
+
 def validate_email(email):
     """Validate email format"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    # Cheap checks first so obviously malformed input never reaches the regex
+    if '@' not in email or len(email) > MAX_EMAIL_LENGTH:
+        return False
+    return EMAIL_PATTERN.match(email) is not None
 
 def validate_password(password):
     """Validate password strength"""
@@ -17,145 +35,168 @@ def validate_password(password):
         return False, "Password must be at least 6 characters long"
     return True, ""
 
+def json_body():
+    """Parsed JSON request body, or {} when it is missing, malformed or not sent as JSON; parsed once per request"""
+    return request.get_json(silent=True) or {}
+
+def flag_arg(name):
+    """Read a boolean query-string flag such as ?summary=1"""
+    return request.args.get(name, '').lower() in ('1', 'true', 'yes')
+
+def json_errors(message):
+    """Decorate a route so any unexpected exception rolls back the session, is logged, and returns {'error': message}, 500"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                return view(*args, **kwargs)
+            except Exception:
+                db.session.rollback()
+                # Exception text can include SQL, table and constraint names, so it only goes to the log
+                current_app.logger.exception(message)
+                return jsonify({'error': message}), 500
+        return wrapper
+    return decorator
+
 def get_user_from_token():
-    """Extract user from JWT token in Authorization header"""
-    auth_header = request.headers.get('Authorization')
+    """Extract user from JWT token in Authorization header, verifying each header once per request"""
+    # Read the raw WSGI value; going through request.headers normalizes the name on every lookup
+    auth_header = request.environ.get('HTTP_AUTHORIZATION')
     
     if not auth_header or not auth_header.startswith('Bearer '):
         return None, {'error': 'No token provided'}, 401
     
-    token = auth_header.split(' ')[1]
+    user_cache = g.setdefault('_user_cache', {})
+    if auth_header in user_cache:
+        return user_cache[auth_header]
+    
+    # Oversized tokens can't be ours; reject them before hashing or decoding
+    token = auth_header[7:].strip()
+    if len(token) > MAX_TOKEN_LENGTH:
+        return None, {'error': 'Invalid or expired token'}, 401
+    
     user = User.verify_jwt_token(token)
     
     if not user:
         return None, {'error': 'Invalid or expired token'}, 401
     
+    user_cache[auth_header] = (user, None, None)
     return user, None, None
 
 @user_bp.route('/auth/register', methods=['POST'])
-@cross_origin()
+@json_errors('Registration failed')
 def register():
     """Register a new user"""
-    try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-        
-        username = data.get('username', '').strip()
-        email = data.get('email', '').strip().lower()
-        password = data.get('password', '')
-        
-        # Validate input
-        if not username or not email or not password:
-            return jsonify({'error': 'All fields are required'}), 400
-        
-        if len(username) < 3:
-            return jsonify({'error': 'Username must be at least 3 characters long'}), 400
-        
-        if not validate_email(email):
-            return jsonify({'error': 'Please enter a valid email address'}), 400
-        
-        is_valid, password_error = validate_password(password)
-        if not is_valid:
-            return jsonify({'error': password_error}), 400
-        
-        # Check if user already exists
-        existing_user = User.query.filter(
-            (User.username == username) | (User.email == email)
-        ).first()
-        
-        if existing_user:
-            if existing_user.username == username:
-                return jsonify({'error': 'Username already exists'}), 409
-            else:
-                return jsonify({'error': 'Email already exists'}), 409
-        
-        # Create new user
-        user = User(username=username, email=email, password=password)
-        user.update_last_login()
-        
-        db.session.add(user)
-        db.session.commit()
-        
-        # Generate JWT token
-        jwt_token = user.generate_jwt_token()
-        
-        return jsonify({
-            'success': True,
-            'message': 'Account created successfully',
-            'user': user.to_dict(),
-            'token': jwt_token
-        }), 201
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': f'Registration failed: {str(e)}'}), 500
+    data = json_body()
+    
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    
+    username = data.get('username', '').strip()
+    email = data.get('email', '').strip().lower()
+    password = data.get('password', '')
+    
+    # Validate input
+    if not username or not email or not password:
+        return jsonify({'error': 'All fields are required'}), 400
+    
+    if len(username) > MAX_USERNAME_LENGTH or len(email) > MAX_EMAIL_LENGTH or len(password) > MAX_PASSWORD_LENGTH:
+        return jsonify({'error': 'Input too long'}), 400
+    
+    if len(username) < 3:
+        return jsonify({'error': 'Username must be at least 3 characters long'}), 400
+    
+    if not validate_email(email):
+        return jsonify({'error': 'Please enter a valid email address'}), 400
+    
+    is_valid, password_error = validate_password(password)
+    if not is_valid:
+        return jsonify({'error': password_error}), 400
+    
+    # Check if user already exists
+    taken = User.find_taken_field(username=username, email=email)
+    if taken == 'username':
+        return jsonify({'error': 'Username already exists'}), 409
+    if taken == 'email':
+        return jsonify({'error': 'Email already exists'}), 409
+    
+    # Create new user
+    user = User(username=username, email=email, password=password)
+    user.update_last_login()
+    
+    db.session.add(user)
+    db.session.commit()
+    
+    # Generate JWT token
+    jwt_token = user.generate_jwt_token()
+    
+    return jsonify({
+        'success': True,
+        'message': 'Account created successfully',
+        'user': user.to_dict(),
+        'token': jwt_token
+    }), 201
 
 @user_bp.route('/auth/login', methods=['POST'])
-@cross_origin()
+@json_errors('Login failed')
 def login():
     """Login user"""
-    try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-        
-        identifier = data.get('username', '').strip()
-        password = data.get('password', '')
-        
-        if not identifier or not password:
-            return jsonify({'error': 'Username and password are required'}), 400
-        
-        # Find user by username or email
-        user = User.find_by_username_or_email(identifier)
-        
-        if not user or not user.check_password(password):
-            return jsonify({'error': 'Invalid username or password'}), 401
-        
-        # Update last login
-        user.update_last_login()
+    data = json_body()
+    
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    
+    identifier = data.get('username', '').strip()
+    password = data.get('password', '')
+    
+    if not identifier or not password:
+        return jsonify({'error': 'Username and password are required'}), 400
+    
+    # No stored username or email is longer than this, so skip the lookup and hash check
+    if len(identifier) > max(MAX_USERNAME_LENGTH, MAX_EMAIL_LENGTH):
+        return jsonify({'error': 'Input too long'}), 400
+    
+    # Find user by username or email and check the password in constant work
+    user = User.authenticate(identifier, password)
+    if not user:
+        return jsonify({'error': 'Invalid username or password'}), 401
+    
+    # Upgrade hashes made with older parameters while the plaintext is at hand
+    if user.password_needs_rehash():
+        user.set_password(password)
+    
+    # Update last login; within LAST_LOGIN_RESOLUTION nothing changes, so skip the write entirely
+    user.update_last_login()
+    if db.session.is_modified(user):
         db.session.commit()
-        
-        # Generate JWT token
-        jwt_token = user.generate_jwt_token()
-        
-        return jsonify({
-            'success': True,
-            'message': 'Login successful',
-            'user': user.to_dict(),
-            'token': jwt_token
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': f'Login failed: {str(e)}'}), 500
+    
+    # Generate JWT token
+    jwt_token = user.generate_jwt_token()
+    
+    return jsonify({
+        'success': True,
+        'message': 'Login successful',
+        'user': user.to_dict(),
+        'token': jwt_token
+    }), 200
 
 @user_bp.route('/auth/logout', methods=['POST'])
-@cross_origin()
+@json_errors('Logout failed')
 def logout():
     """Logout user"""
-    try:
-        # For JWT tokens, we don't need to invalidate on server side
-        # The client will simply discard the token
-        # But we can still validate the token to ensure it's a valid logout request
-        
-        user, error_response, status_code = get_user_from_token()
-        if error_response:
-            # Even if token is invalid, we consider logout successful
-            pass
-        
-        return jsonify({
-            'success': True,
-            'message': 'Logout successful'
-        }), 200
-        
-    except Exception as e:
-        return jsonify({'error': f'Logout failed: {str(e)}'}), 500
+    # For JWT tokens, we don't need to invalidate on server side
+    # The client will simply discard the token
+    # Logout succeeds even for invalid tokens, so skip verifying it; just drop any cached verification
+    auth_header = request.environ.get('HTTP_AUTHORIZATION')
+    if auth_header and auth_header.startswith('Bearer '):
+        invalidate_jwt_token(auth_header[7:].strip())
+    
+    return jsonify({
+        'success': True,
+        'message': 'Logout successful'
+    }), 200
 
 @user_bp.route('/auth/validate', methods=['GET'])
-@cross_origin()
 def validate_session():
     """Validate user session"""
     try:
@@ -172,117 +213,128 @@ def validate_session():
         return jsonify({'valid': False, 'error': f'Validation failed: {str(e)}'}), 500
 
 @user_bp.route('/auth/refresh', methods=['POST'])
-@cross_origin()
+@json_errors('Token refresh failed')
 def refresh_token():
     """Refresh user session token"""
-    try:
-        user, error_response, status_code = get_user_from_token()
-        if error_response:
-            return jsonify(error_response), status_code
-        
-        # Generate new JWT token
-        new_token = user.generate_jwt_token()
-        user.update_last_login()
-        
+    user, error_response, status_code = get_user_from_token()
+    if error_response:
+        return jsonify(error_response), status_code
+    
+    # Generate new JWT token
+    new_token = user.generate_jwt_token()
+    user.update_last_login()
+    
+    if db.session.is_modified(user):
         db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'token': new_token,
-            'user': user.to_dict()
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': f'Token refresh failed: {str(e)}'}), 500
+    
+    return jsonify({
+        'success': True,
+        'token': new_token,
+        'user': user.to_dict()
+    }), 200
 
 @user_bp.route('/users/profile', methods=['GET'])
-@cross_origin()
+@json_errors('Failed to get profile')
 def get_profile():
     """Get current user profile"""
-    try:
-        user, error_response, status_code = get_user_from_token()
-        if error_response:
-            return jsonify(error_response), status_code
-        
-        return jsonify({
-            'success': True,
-            'user': user.to_dict()
-        }), 200
-        
-    except Exception as e:
-        return jsonify({'error': f'Failed to get profile: {str(e)}'}), 500
+    user, error_response, status_code = get_user_from_token()
+    if error_response:
+        return jsonify(error_response), status_code
+    
+    return jsonify({
+        'success': True,
+        'user': user.to_dict()
+    }), 200
 
 @user_bp.route('/users/profile', methods=['PUT'])
-@cross_origin()
+@json_errors('Failed to update profile')
 def update_profile():
     """Update current user profile"""
-    try:
-        user, error_response, status_code = get_user_from_token()
-        if error_response:
-            return jsonify(error_response), status_code
-        
-        data = request.get_json()
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-        
-        # Update allowed fields
-        if 'username' in data:
-            new_username = data['username'].strip()
-            if len(new_username) < 3:
-                return jsonify({'error': 'Username must be at least 3 characters long'}), 400
-            
-            # Check if username is already taken by another user
-            existing_user = User.query.filter(
-                User.username == new_username,
-                User.id != user.id
-            ).first()
-            
-            if existing_user:
-                return jsonify({'error': 'Username already exists'}), 409
-            
-            user.username = new_username
-        
-        if 'email' in data:
-            new_email = data['email'].strip().lower()
-            if not validate_email(new_email):
-                return jsonify({'error': 'Please enter a valid email address'}), 400
-            
-            # Check if email is already taken by another user
-            existing_user = User.query.filter(
-                User.email == new_email,
-                User.id != user.id
-            ).first()
-            
-            if existing_user:
-                return jsonify({'error': 'Email already exists'}), 409
-            
-            user.email = new_email
-        
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'message': 'Profile updated successfully',
-            'user': user.to_dict()
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': f'Failed to update profile: {str(e)}'}), 500
+    user, error_response, status_code = get_user_from_token()
+    if error_response:
+        return jsonify(error_response), status_code
+    
+    data = json_body()
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    
+    # Validate allowed fields
+    new_username = new_email = None
+    if 'username' in data:
+        new_username = data['username'].strip()
+        if len(new_username) > MAX_USERNAME_LENGTH:
+            return jsonify({'error': 'Input too long'}), 400
+        if len(new_username) < 3:
+            return jsonify({'error': 'Username must be at least 3 characters long'}), 400
+    
+    if 'email' in data:
+        new_email = data['email'].strip().lower()
+        if len(new_email) > MAX_EMAIL_LENGTH:
+            return jsonify({'error': 'Input too long'}), 400
+        if not validate_email(new_email):
+            return jsonify({'error': 'Please enter a valid email address'}), 400
+    
+    # Check if username or email is already taken by another user, in one query
+    taken = User.find_taken_field(username=new_username, email=new_email, exclude_id=user.id)
+    if taken == 'username':
+        return jsonify({'error': 'Username already exists'}), 409
+    if taken == 'email':
+        return jsonify({'error': 'Email already exists'}), 409
+    
+    # Update allowed fields
+    if new_username is not None:
+        user.username = new_username
+    if new_email is not None:
+        user.email = new_email
+    
+    db.session.commit()
+    
+    return jsonify({
+        'success': True,
+        'message': 'Profile updated successfully',
+        'user': user.to_dict()
+    }), 200
 
 # Legacy endpoints for backward compatibility
 @user_bp.route('/users', methods=['GET'])
-@cross_origin()
 def get_users():
-    """Get all users (admin only - for development)"""
-    users = User.query.all()
-    return jsonify([user.to_dict() for user in users])
+    """Get all users (admin only - for development), streamed one keyset page at a time; ?after=<id> resumes"""
+    dumps = current_app.json.dumps
+    
+    # The first page loads here so query errors still get a 500 instead of a truncated body
+    page = users_page(request.args.get('after', 0, type=int))
+    
+    def generate():
+        nonlocal page
+        yield '['
+        separator = ''
+        while page:
+            for user in page:
+                yield separator + dumps(user.to_dict())
+                separator = ','
+            if len(page) < USERS_PAGE_SIZE:
+                break
+            # Drop the finished page from the session so memory stays flat however many users there are
+            last_id = page[-1].id
+            db.session.expunge_all()
+            page = users_page(last_id)
+        yield ']'
+    
+    return current_app.response_class(stream_with_context(generate()), status=200, mimetype='application/json')
+
+def users_page(after_id):
+    """Next USERS_PAGE_SIZE users by id after after_id; an index range scan on the primary key at any depth"""
+    return (
+        User.query.options(defer(User.password_hash))
+        .filter(User.id > after_id)
+        .order_by(User.id)
+        .limit(USERS_PAGE_SIZE)
+        .all()
+    )
 
 @user_bp.route('/users/<int:user_id>', methods=['GET'])
-@cross_origin()
 def get_user(user_id):
     """Get specific user by ID"""
-    user = User.query.get_or_404(user_id)
+    user = db.get_or_404(User, user_id)
     return jsonify(user.to_dict())
 
@@ -0,0 +1,78 @@
+import os
+import sys
+import tempfile
+import unittest
+
+# Point the app at a throwaway SQLite database before it is imported
+_DB_DIR = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.main import app
+
+
+class CrossUserImportTest(unittest.TestCase):
+    """Importing records exported by another user keeps them apart from the original owner's"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.client = app.test_client()
+        cls.owner = cls.register('owner')
+        cls.other = cls.register('other')
+
+    @classmethod
+    def register(cls, username):
+        response = cls.client.post('/api/auth/register', json={
+            'username': username,
+            'email': f'{username}@example.com',
+            'password': 'secret123'
+        })
+        assert response.status_code == 201, response.get_json()
+        return {'Authorization': f"Bearer {response.get_json()['token']}"}
+
+    def create_public_portfolio(self, name):
+        """Create a public portfolio for the owner and return its exported form"""
+        response = self.client.post('/api/portfolios', json={'name': name}, headers=self.owner)
+        self.assertEqual(response.status_code, 201)
+        portfolio = response.get_json()['portfolio']
+        response = self.client.put(f"/api/portfolios/{portfolio['id']}", json={'is_public': True}, headers=self.owner)
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()['portfolio']
+
+    def assert_original_untouched(self, exported):
+        response = self.client.get(f"/api/portfolios/share/{exported['share_id']}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['portfolio']['user_id'], exported['user_id'])
+
+    def test_import_portfolio_of_another_user(self):
+        exported = self.create_public_portfolio('Shared import')
+
+        response = self.client.post('/api/portfolios/import', json=exported, headers=self.other)
+        self.assertEqual(response.status_code, 201, response.get_json())
+        imported = response.get_json()['portfolio']
+        self.assertNotEqual(imported['id'], exported['id'])
+        self.assertNotEqual(imported['share_id'], exported['share_id'])
+        self.assertFalse(imported['is_public'])
+        self.assert_original_untouched(exported)
+
+        # Importing one's own portfolio again is still reported as a duplicate
+        response = self.client.post('/api/portfolios/import', json=exported, headers=self.owner)
+        self.assertEqual(response.status_code, 409)
+
+    def test_migrate_portfolios_of_another_user(self):
+        exported = self.create_public_portfolio('Shared migrate')
+
+        response = self.client.post('/api/portfolios/migrate', json={'portfolios': [exported]}, headers=self.other)
+        self.assertEqual(response.status_code, 200, response.get_json())
+        self.assertEqual(response.get_json()['imported_count'], 1)
+
+        portfolios = self.client.get('/api/portfolios', headers=self.other).get_json()['portfolios']
+        migrated = next(p for p in portfolios if p['name'] == 'Shared migrate')
+        self.assertNotEqual(migrated['id'], exported['id'])
+        self.assertNotEqual(migrated['share_id'], exported['share_id'])
+        self.assertFalse(migrated['is_public'])
+        self.assert_original_untouched(exported)
+
+
+if __name__ == '__main__':
+    unittest.main()